@@ -1,13 +1,24 @@
+import asyncio
 import os
 import re
-import json
-import requests
+import functools
+import selectors
+import shlex
+import signal
 import subprocess
 import sys
+import time
+import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, FrozenSet, Optional, Tuple
 import argparse
 
+import httpx
+import orjson
+
+# Compiled once at import; this runs on every turn of the agentic loop.
+_EXEC_RE = re.compile(r"\[\[EXEC:\s*(.*?)\s*\]\]", re.DOTALL)
+
 # --- CONFIGURATION ---
 import os
 
@@ -16,6 +27,19 @@ MODEL_TEMPERATURE = float(os.getenv("OSAGENT_MODEL_TEMPERATURE", "0.1"))
 MODEL_AUTOMATION = os.getenv("OSAGENT_MODEL_AUTOMATION", "False").lower() == "true"
 LOG_DIR = os.getenv("OSAGENT_LOG_DIR", "logs")
 MAX_COMMAND_EXECUTIONS = int(os.getenv("OSAGENT_MAX_COMMAND_EXECUTIONS", "50"))
+# Select knowledge per turn instead of sending every entry in a fixed system
+# prompt. Saves prompt tokens but defeats the server's prefix (KV) cache.
+DYNAMIC_KNOWLEDGE = os.getenv("OSAGENT_DYNAMIC_KNOWLEDGE", "False").lower() == "true"
+# User turns replayed verbatim to the LLM; older turns are folded into a summary.
+# At least two, so the half that gets summarized is never empty.
+MAX_HISTORY_TURNS = max(int(os.getenv("OSAGENT_MAX_HISTORY_TURNS", "8")), 2)
+# llama.cpp speculative decoding: maximum tokens the server's draft model
+# (llama-server -md) proposes per step. 0 leaves the server default.
+DRAFT_MAX = int(os.getenv("OSAGENT_DRAFT_MAX", "0"))
+# Token budget for the first attempt at a response (enough for a tool call) and
+# for the regenerated answer when that attempt runs out.
+FIRST_MAX_TOKENS = int(os.getenv("OSAGENT_FIRST_MAX_TOKENS", "256"))
+MAX_TOKENS = int(os.getenv("OSAGENT_MAX_TOKENS", "2048"))
 
 # --- EMBEDDED KNOWLEDGE BASE ---
 KNOWLEDGE_BASE = {
@@ -44,6 +68,29 @@ KNOWLEDGE_BASE = {
     }
 }
 
+# --- SYSTEM PROMPT ---
+BASE_SYSTEM_PROMPT = (
+    "You are an Advanced Linux Automation Agent. You have access to a local terminal.\n\n"
+    "**TOOL USE:** To execute a command, use: [[EXEC: <command>]]\n\n"
+    "**RULES:** Stop after calling EXEC. Analyze output before final response.\n\n"
+    "**SAFETY:** This agent operates in a risk-averse mode prioritizing system stability. "
+    "All commands are filtered through safety mechanisms. Never attempt to bypass security controls."
+)
+
+SUMMARY_PROMPT = (
+    "Summarize the prior conversation in 200 tokens or fewer. Keep the user's goals, "
+    "the commands that were run and what they showed, and any open questions."
+)
+# Some headroom over the 200 tokens the prompt asks for; a longer reply is
+# treated as a failed summary rather than kept half-finished.
+SUMMARY_MAX_TOKENS = 320
+
+# Byte-identical on every turn so the server can reuse its cached prefix.
+STATIC_SYSTEM_PROMPT = (
+    f"{BASE_SYSTEM_PROMPT}\n\n--- AVAILABLE KNOWLEDGE BASES ---\n"
+    + "".join(f"\n{data['content']}\n" for data in KNOWLEDGE_BASE.values())
+)
+
 # --- LOGGING SYSTEM ---
 
 
@@ -52,11 +99,11 @@ class SessionLogger:
     Handles file-based logging for all agent communications.
     """
 
-    def __init__(self, directory: str):
+    def __init__(self, directory: str, suffix: str = ""):
         self.directory = directory
         self._ensure_dir()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = os.path.join(self.directory, f"session_{timestamp}.log")
+        self.log_file = os.path.join(self.directory, f"session_{timestamp}{suffix}.log")
         # Log session start
         self.log("SYSTEM", f"Session started. Log file: {self.log_file}")
 
@@ -124,14 +171,129 @@ class TerminalTool:
         r"zip\s+.*\-r",  # Recursive zip
     ]
 
-    @staticmethod
-    def execute(command: str) -> str:
-        # Check against dangerous patterns
-        import re
+    _DANGEROUS_RES = [re.compile(p, re.IGNORECASE) for p in DANGEROUS_PATTERNS]
+
+    COMMAND_TIMEOUT = 30
+    # High descriptors holding the shell's original stdout / stderr pipes
+    _SAVED_STDOUT = 98
+    _SAVED_STDERR = 99
+
+    def __init__(self):
+        """Commands run in one long-lived bash process, which keeps cwd and env."""
+        # Set while execute() waits on a command, possibly in a worker thread
+        self._busy = False
+        self._closed = False
+        self._spawn()
+
+    def _spawn(self):
+        self.proc = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            # Own process group, so a timed-out command can be killed with its children
+            start_new_session=True,
+        )
+
+    def _respawn(self):
+        if self.proc.poll() is None:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        self.proc.wait()
+        self._close_pipes()
+        if not self._closed:
+            self._spawn()
+
+    def _close_pipes(self):
+        for pipe in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            pipe.close()
+
+    def close(self):
+        self._closed = True
+        if self.proc.poll() is None:
+            if self._busy:
+                # Interrupted mid-command (Ctrl+C). The shell's own session
+                # keeps the terminal's SIGINT from reaching the command, so
+                # kill it here; the waiting execute() then sees EOF.
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            else:
+                self.proc.stdin.close()
+            self.proc.wait()
+        if not self._busy:
+            # Otherwise the reader still owns the pipes and closes them itself
+            self._close_pipes()
+
+    def _run(self, command: str) -> Tuple[int, str, str]:
+        """
+        Sends `command` to the shell followed by a sentinel on stdout (carrying
+        the exit code) and one on stderr, then reads both pipes until each
+        sentinel shows up. eval keeps a malformed command from desynchronising
+        the shell, and stdin is detached so nothing can swallow the sentinels.
+        The group redirects to copies of the pipes taken just before it, so
+        a command like `exec 2>&1` only lasts for its own eval, and one that
+        closes or reuses the copies can't break the commands after it.
+        """
+        if self.proc.poll() is not None:
+            self._spawn()
+        marker = f"__OSAGENT_DONE_{uuid.uuid4().hex}__"
+        self.proc.stdin.write(
+            f"exec {self._SAVED_STDOUT}>&1 {self._SAVED_STDERR}>&2\n"
+            f"{{ eval {shlex.quote(command)}\n}} < /dev/null 1>&{self._SAVED_STDOUT} 2>&{self._SAVED_STDERR}\n"
+            f"printf '%s:%d\\n' {marker} $?\n"
+            f"printf '%s\\n' {marker} >&2\n".encode()
+        )
+        end = re.compile(rf"{marker}(?::(\d+))?\n$".encode())
+        buffers = {self.proc.stdout: bytearray(), self.proc.stderr: bytearray()}
+        results = {}
+        closed = set()
+        deadline = time.monotonic() + self.COMMAND_TIMEOUT
+        with selectors.DefaultSelector() as selector:
+            for stream in buffers:
+                selector.register(stream, selectors.EVENT_READ)
+            while len(results) + len(closed) < len(buffers):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._respawn()
+                    raise subprocess.TimeoutExpired(command, self.COMMAND_TIMEOUT)
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        # Keep draining the other pipe; this one is done.
+                        closed.add(key.fileobj)
+                        selector.unregister(key.fileobj)
+                        continue
+                    buffer = buffers[key.fileobj]
+                    buffer += chunk
+                    match = end.search(buffer)
+                    if match:
+                        results[key.fileobj] = match
+                        selector.unregister(key.fileobj)
+
+        out, err = (
+            bytes(buffer[: results[stream].start()] if stream in results else buffer)
+            .decode(errors="replace")
+            for stream, buffer in buffers.items()
+        )
+        if not closed:
+            return int(results[self.proc.stdout].group(1)), out, err
+
+        # A pipe closed: the command exited the shell (or broke its output), so
+        # collect its exit status and start a fresh one.
+        if self.proc.stdout in results:
+            returncode = int(results[self.proc.stdout].group(1))
+        else:
+            try:
+                returncode = self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                returncode = -signal.SIGKILL
+        self._respawn()
+        return returncode, out, err
 
-        for pattern in TerminalTool.DANGEROUS_PATTERNS:
-            if re.search(pattern, command, re.IGNORECASE):
-                return f"Error: Command blocked by safety filter - matches dangerous pattern: {pattern}"
+    def execute(self, command: str) -> str:
+        # Check against dangerous patterns
+        for regex in TerminalTool._DANGEROUS_RES:
+            if regex.search(command):
+                return f"Error: Command blocked by safety filter - matches dangerous pattern: {regex.pattern}"
 
         # Additional safety checks
         # Block commands with excessive length (potential buffer overflow attempts)
@@ -142,221 +304,509 @@ class TerminalTool:
         if command.count("|") > 10 or command.count(">") > 5 or command.count("<") > 5:
             return "Error: Command has excessive pipes/redirects - potential security risk."
 
+        self._busy = True
         try:
-            result = subprocess.run(
-                command, shell=True, capture_output=True, text=True, timeout=30
-            )
-            output = result.stdout if result.stdout else ""
-            errors = result.stderr if result.stderr else ""
-            if result.returncode != 0:
-                return f"Execution Error (Exit Code {result.returncode}):\n{errors}"
+            returncode, output, errors = self._run(command)
+            if returncode != 0:
+                return f"Execution Error (Exit Code {returncode}):\n{errors}"
             return (
                 output if output.strip() else f"Success (no output). Stderr: {errors}"
             )
         except subprocess.TimeoutExpired:
-            return "Error: Command timed out after 30 seconds."
+            return f"Error: Command timed out after {self.COMMAND_TIMEOUT} seconds."
         except Exception as e:
             return f"Error executing command: {str(e)}"
+        finally:
+            self._busy = False
 
 
 # --- AGENT CORE ---
 
 
 class ContextManager:
+    # KNOWLEDGE_BASE flattened into parallel arrays indexed by entry.
+    # Triggers are lowercased here, once, since inputs are matched lowercased.
+    _names: List[str] = list(KNOWLEDGE_BASE)
+    _bodies: List[str] = [f"\n{data['content']}\n" for data in KNOWLEDGE_BASE.values()]
+    _triggers_per_entry: List[List[str]] = [
+        [t.lower() for t in data.get("triggers", [])] for data in KNOWLEDGE_BASE.values()
+    ]
+
     @staticmethod
-    def get_relevant_context(user_input: str) -> str:
-        disclosed_text = ""
-        input_lower = user_input.lower()
-        for name, data in KNOWLEDGE_BASE.items():
-            if any(trigger in input_lower for trigger in data.get("triggers", [])):
-                disclosed_text += f"\n{data['content']}\n"
-        return disclosed_text
+    def get_relevant_entries(user_input: str) -> FrozenSet[int]:
+        """Indices of the knowledge base entries triggered by `user_input`."""
+        return ContextManager._match(user_input.lower())
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _match(input_lower: str) -> FrozenSet[int]:
+        # Pure function of the input, and REPL users repeat themselves a lot
+        # A handful of short triggers: C-level substring tests beat any
+        # pure-Python automaton at this size.
+        return frozenset(
+            i
+            for i, triggers in enumerate(ContextManager._triggers_per_entry)
+            if any(trigger in input_lower for trigger in triggers)
+        )
 
-class AgentLLM:
     @staticmethod
-    def chat(messages: List[Dict]) -> str:
-        payload = {
-            "messages": messages,
-            "temperature": MODEL_TEMPERATURE,
-            "stream": False,
-            "stop": ["User>", "System:"],
-        }
-        try:
-            response = requests.post(API_URL, json=payload, timeout=120)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except Exception as e:
-            return f"Error: {str(e)}"
+    @functools.lru_cache(maxsize=32)
+    def build_system_prompt(entries: FrozenSet[int]) -> str:
+        """Renders the system prompt for a set of active knowledge base entries."""
+        if not entries:
+            return BASE_SYSTEM_PROMPT
+        specialized_context = "".join(ContextManager._bodies[i] for i in sorted(entries))
+        return f"{BASE_SYSTEM_PROMPT}\n\n--- ACTIVE KNOWLEDGE ---\n{specialized_context}"
 
 
-# --- ORCHESTRATOR ---
+class StreamPrinter:
+    """
+    Echoes streamed tokens to stdout, replacing the "Agent thinking..."
+    indicator with the "Agent:" prefix once the first token arrives.
+    """
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+        if not quiet:
+            print("Agent thinking...", end="\r", flush=True)
+        self.started = False
+
+    def __call__(self, token: str):
+        if self.quiet:
+            return
+        if not self.started:
+            sys.stdout.write("\r\033[KAgent: ")
+            self.started = True
+        sys.stdout.write(token)
+        sys.stdout.flush()
+
+    def finish(self):
+        if self.quiet:
+            return
+        if not self.started:
+            sys.stdout.write("\r\033[KAgent: ")
+        print("\n")
+
+
+# Shared client so every request reuses the same keep-alive connection.
+# The connection limit leaves room for run_many()'s concurrent sessions.
+_CLIENT = httpx.AsyncClient(
+    timeout=120,
+    headers={"Content-Type": "application/json"},
+    limits=httpx.Limits(max_connections=64),
+)
+
+
+# Request fields that are the same on every call, encoded once.
+_PAYLOAD_TEMPLATE = {
+    "temperature": MODEL_TEMPERATURE,
+    "stream": True,
+    "stop": ["User>", "System:"],
+    # llama.cpp extension: reuse the KV cache of the common prompt prefix
+    "cache_prompt": True,
+}
+if DRAFT_MAX:
+    _PAYLOAD_TEMPLATE["speculative.n_max"] = DRAFT_MAX
+# The encoded template without its opening brace, to follow the per-call fields
+_PAYLOAD_TAIL = orjson.dumps(_PAYLOAD_TEMPLATE)[1:]
+# Summaries are plain prose that may quote anything from the transcript
+_SUMMARY_PAYLOAD_TAIL = orjson.dumps({**_PAYLOAD_TEMPLATE, "stop": []})[1:]
 
 
-def run_agentic_session():
-    terminal = TerminalTool()
-    logger = SessionLogger(LOG_DIR)
+class ReplayFilter:
+    """
+    Wraps a token callback for a regenerated response whose beginning has
+    already been shown: tokens are swallowed while they repeat `shown`, and
+    only the new continuation is passed on. If the regenerated text diverges,
+    it is shown in full after a separator.
+    """
 
-    # Track command executions for rate limiting
-    command_count = 0
+    def __init__(self, shown: str, on_token: Callable[[str], None]):
+        self.shown = shown
+        self.on_token = on_token
+        self.received = ""
+        self.live = False
+
+    def __call__(self, token: str):
+        if self.live:
+            self.on_token(token)
+            return
+        self.received += token
+        if self.shown.startswith(self.received):
+            return
+        self.live = True
+        if self.received.startswith(self.shown):
+            self.on_token(self.received[len(self.shown) :])
+        else:
+            self.on_token(f"\n[...]\n{self.received}")
 
-    base_system_prompt = (
-        "You are an Advanced Linux Automation Agent. You have access to a local terminal.\n\n"
-        "**TOOL USE:** To execute a command, use: [[EXEC: <command>]]\n\n"
-        "**RULES:** Stop after calling EXEC. Analyze output before final response.\n\n"
-        "**SAFETY:** This agent operates in a risk-averse mode prioritizing system stability. "
-        "All commands are filtered through safety mechanisms. Never attempt to bypass security controls."
-    )
 
-    print(f"\n--- AGENTIC TERMINAL READY (Logging to {LOG_DIR}/) ---")
-    history = []
+class AgentLLM:
+    @staticmethod
+    def _echo(text: str):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    @staticmethod
+    async def chat(
+        messages: List[Dict],
+        on_token: Optional[Callable[[str], None]] = None,
+        max_tokens: int = FIRST_MAX_TOKENS,
+    ) -> str:
+        """
+        Streams a completion from the LLM API, passing each token to `on_token`
+        as it arrives, and returns the full response text, or only an
+        "Error: ..." message if the request failed, even part-way through.
+
+        Generation is cut short as soon as a complete [[EXEC: ...]] marker has
+        been received, since anything after the tool call is discarded anyway.
+        Most turns are short tool calls, so the first attempt is capped at
+        `max_tokens`; a response that hits the cap without a complete tool
+        call (none at all, or one cut off mid-command) is regenerated with
+        the full MAX_TOKENS budget.
+        """
+        if on_token is None:
+            on_token = AgentLLM._echo
+        text, finish_reason = await AgentLLM._stream(messages, on_token, max_tokens)
+        if finish_reason != "length" or max_tokens >= MAX_TOKENS or _EXEC_RE.search(text):
+            return text
+        text, _ = await AgentLLM._stream(
+            messages, ReplayFilter(text, on_token), MAX_TOKENS
+        )
+        return text
+
+    @staticmethod
+    async def summarize(transcript: str) -> Tuple[str, bool]:
+        """
+        Condenses a conversation transcript. Unlike chat(), nothing in the
+        text ends the stream early, so a quoted tool call can't truncate it.
+        Returns the summary and whether it is complete; on failure the text
+        is an "Error: ..." message.
+        """
+        text, finish_reason = await AgentLLM._stream(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            lambda token: None,
+            SUMMARY_MAX_TOKENS,
+            tail=_SUMMARY_PAYLOAD_TAIL,
+            stop_on_exec=False,
+        )
+        if finish_reason == "length":
+            return f"Error: summary exceeded {SUMMARY_MAX_TOKENS} tokens", False
+        return text, finish_reason != "error"
 
-    while True:
+    @staticmethod
+    async def _stream(
+        messages: List[Dict],
+        on_token: Callable[[str], None],
+        max_tokens: int,
+        tail: bytes = _PAYLOAD_TAIL,
+        stop_on_exec: bool = True,
+    ) -> Tuple[str, Optional[str]]:
+        # Only the per-call fields are serialized; the constant ones are
+        # spliced in from the pre-encoded template.
+        body = b"".join(
+            (
+                b'{"messages":',
+                orjson.dumps(messages),
+                b',"max_tokens":%d,' % max_tokens,
+                tail,
+            )
+        )
+        text = ""
+        finish_reason = None
+        # Offset of the first "[[EXEC:" marker, once one has been streamed
+        exec_start = -1
         try:
-            user_input = input("\nUser> ")
-        except KeyboardInterrupt:
-            break
+            async with _CLIENT.stream("POST", API_URL, content=body) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    choice = orjson.loads(data)["choices"][0]
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                    delta = choice.get("delta", {}).get("content")
+                    if not delta:
+                        continue
+                    # Only the new delta (plus enough overlap for a marker
+                    # split across tokens) is scanned, not the whole buffer.
+                    scan_from = len(text)
+                    text += delta
+                    on_token(delta)
+                    if not stop_on_exec:
+                        continue
+                    if exec_start == -1:
+                        exec_start = text.find("[[EXEC:", max(scan_from - 6, 0))
+                    if exec_start != -1 and text.find(
+                        "]]", max(scan_from - 1, exec_start + 7)
+                    ) != -1:
+                        # Leaving the stream context unread drops the
+                        # connection, and llama.cpp aborts generation when
+                        # its client goes away.
+                        break
+        except Exception as e:
+            # Reported as its own result: a partial response is not an answer.
+            error = f"Error: {str(e)}"
+            on_token(f"\n{error}" if text else error)
+            return error, "error"
 
-        if user_input.lower() in ["exit", "quit", "q"]:
-            logger.log("SYSTEM", "User terminated session.")
-            break
+        return text, finish_reason
 
-        logger.log("USER", user_input)
 
-        specialized_context = ContextManager.get_relevant_context(user_input)
-        current_system_message = base_system_prompt
-        if specialized_context:
-            current_system_message += (
-                f"\n\n--- ACTIVE KNOWLEDGE ---\n{specialized_context}"
-            )
+# --- ORCHESTRATOR ---
 
-        messages = [{"role": "system", "content": current_system_message}]
-        messages.extend(history)
+
+def _is_user_turn(message: Dict) -> bool:
+    """True for messages typed by the user, as opposed to tool observations."""
+    return message["role"] == "user" and not message["content"].startswith(
+        "COMMAND OUTPUT:"
+    )
+
+
+class AgentSession:
+    """
+    Holds the state of one agent session and runs the LLM / tool execution
+    loop for each user turn. Shared by the interactive, single-prompt and
+    batch modes; batch sessions are `quiet` and never prompt the user.
+    """
+
+    def __init__(self, quiet: bool = False, log_suffix: str = ""):
+        self.quiet = quiet
+        self.terminal = TerminalTool()
+        self.logger = SessionLogger(LOG_DIR, log_suffix)
+        # Track command executions for rate limiting
+        self.command_count = 0
+        self.system_prompt = (
+            BASE_SYSTEM_PROMPT if DYNAMIC_KNOWLEDGE else STATIC_SYSTEM_PROMPT
+        )
+        # The whole conversation, tool observations included, exactly as it is
+        # sent to the LLM. Only grows, except for messages[0] (the system
+        # prompt) and when _trim_history folds old turns into a summary.
+        self.messages: List[Dict] = [{"role": "system", "content": self.system_prompt}]
+
+    async def handle_turn(self, user_input: str) -> str:
+        """Runs one user turn to completion and returns the final response."""
+        self.logger.log("USER", user_input)
+        await self._trim_history()
+
+        messages = self.messages
         messages.append({"role": "user", "content": user_input})
-        history.append({"role": "user", "content": user_input})
+
+        if DYNAMIC_KNOWLEDGE:
+            self._select_knowledge(user_input)
 
         while True:
-            print("Agent thinking...", end="\r")
-            response = AgentLLM.chat(messages)
-            print(f"\rAgent: {response}\n")
+            printer = StreamPrinter(quiet=self.quiet)
+            response = await AgentLLM.chat(messages, on_token=printer)
+            printer.finish()
 
-            logger.log("AGENT", response)
-            history.append({"role": "assistant", "content": response})
+            self.logger.log("AGENT", response)
             messages.append({"role": "assistant", "content": response})
 
-            match = re.search(r"\[\[EXEC:\s*(.*?)\s*\]\]", response, re.DOTALL)
+            match = _EXEC_RE.search(response)
             if match:
                 cmd = match.group(1).strip()
-                print(f"\n[?] Agent requests execution: \033[93m{cmd}\033[0m")
-
-                if MODEL_AUTOMATION:
-                    confirm = "y"
-                else:
-                    confirm = input("[y/n] > ").lower()
-
-                if confirm == "y":
-                    # Rate limit command executions
-                    command_count += 1
-                    if command_count > MAX_COMMAND_EXECUTIONS:
-                        execution_result = f"Error: Command execution limit exceeded ({MAX_COMMAND_EXECUTIONS}). Please restart the session to continue."
-                        logger.log("SYSTEM", execution_result)
-                        print(f"[!] {execution_result}")
-                    else:
-                        logger.log("SYSTEM", f"Executing Command: {cmd}")
-                        execution_result = terminal.execute(cmd)
-                        logger.log("TERMINAL_OUTPUT", execution_result)
-                        print(f"[*] Output:\n{execution_result}")
-                else:
-                    execution_result = "User denied execution."
-                    logger.log("SYSTEM", "User denied command execution.")
-                    print("[!] Execution denied.")
-
+                execution_result = await self.execute_tool(cmd)
                 messages.append(
                     {"role": "user", "content": f"COMMAND OUTPUT:\n{execution_result}"}
                 )
+                if self.command_count > MAX_COMMAND_EXECUTIONS:
+                    # Asking the LLM again can't get past the limit
+                    response = execution_result
+                    break
                 continue
             else:
                 break
 
+        return response
+
+    async def _trim_history(self):
+        """
+        Keeps prefill cost bounded by replaying at most MAX_HISTORY_TURNS user
+        turns. Once the window is full, its older half is folded into a rolling
+        summary that stands in for it as a synthetic assistant message, so the
+        summarization call only runs every MAX_HISTORY_TURNS / 2 turns.
+        """
+        starts = [i for i, m in enumerate(self.messages) if _is_user_turn(m)]
+        if len(starts) < MAX_HISTORY_TURNS:
+            return
+        cut = starts[-(MAX_HISTORY_TURNS // 2)]
+
+        # Command output is left out: the assistant's follow-up already reflects it.
+        transcript = "\n\n".join(
+            f"{m['role'].upper()}: {m['content']}"
+            for m in self.messages[1:cut]
+            if not m["content"].startswith("COMMAND OUTPUT:")
+        )
+        summary, complete = await AgentLLM.summarize(transcript)
+        if not complete:
+            self.logger.log("SYSTEM", f"History summarization failed: {summary}")
+            return
+
+        self.logger.log("SYSTEM", f"Summarized {cut - 1} earlier messages:\n{summary}")
+        self.messages[1:cut] = [
+            {
+                "role": "assistant",
+                "content": f"Summary of the earlier conversation:\n{summary.strip()}",
+            }
+        ]
+
+    def _select_knowledge(self, user_input: str):
+        # The trigger lookup takes microseconds, so it runs before the request
+        # rather than alongside a speculative one.
+        entries = ContextManager.get_relevant_entries(user_input)
+        system_prompt = ContextManager.build_system_prompt(entries)
+        if system_prompt == self.system_prompt:
+            return
+        active = ", ".join(ContextManager._names[i] for i in sorted(entries)) or "none"
+        self.logger.log("SYSTEM", f"Active knowledge: {active}")
+        self.system_prompt = system_prompt
+        self.messages[0] = {"role": "system", "content": system_prompt}
+
+    def close(self):
+        self.terminal.close()
+
+    def _say(self, text: str):
+        if not self.quiet:
+            print(text)
+
+    async def execute_tool(self, cmd: str) -> str:
+        self._say(f"\n[?] Agent requests execution: \033[93m{cmd}\033[0m")
+
+        if MODEL_AUTOMATION:
+            confirm = "y"
+        elif self.quiet:
+            # Nobody is there to confirm in batch mode. Skips count toward the
+            # limit, or a model that keeps asking would loop unattended.
+            self.command_count += 1
+            execution_result = "Execution skipped: batch mode only runs commands with OSAGENT_MODEL_AUTOMATION=true."
+            self.logger.log("SYSTEM", execution_result)
+            return execution_result
+        else:
+            confirm = input("[y/n] > ").lower()
+
+        if confirm == "y":
+            # Rate limit command executions
+            self.command_count += 1
+            if self.command_count > MAX_COMMAND_EXECUTIONS:
+                execution_result = f"Error: Command execution limit exceeded ({MAX_COMMAND_EXECUTIONS}). Please restart the session to continue."
+                self.logger.log("SYSTEM", execution_result)
+                self._say(f"[!] {execution_result}")
+            else:
+                self.logger.log("SYSTEM", f"Executing Command: {cmd}")
+                # In a thread, so concurrent batch sessions keep streaming
+                execution_result = await asyncio.to_thread(self.terminal.execute, cmd)
+                self.logger.log("TERMINAL_OUTPUT", execution_result)
+                self._say(f"[*] Output:\n{execution_result}")
+        else:
+            execution_result = "User denied execution."
+            self.logger.log("SYSTEM", "User denied command execution.")
+            self._say("[!] Execution denied.")
+        return execution_result
+
+
+async def run_agentic_session():
+    session = AgentSession()
+
+    print(f"\n--- AGENTIC TERMINAL READY (Logging to {LOG_DIR}/) ---")
 
-def run_single_prompt(prompt: str):
+    try:
+        while True:
+            try:
+                user_input = input("\nUser> ")
+            except KeyboardInterrupt:
+                break
+
+            if user_input.lower() in ["exit", "quit", "q"]:
+                session.logger.log("SYSTEM", "User terminated session.")
+                break
+
+            await session.handle_turn(user_input)
+    finally:
+        session.close()
+
+
+async def run_single_prompt(prompt: str):
     """Run a single prompt and exit"""
-    terminal = TerminalTool()
-    logger = SessionLogger(LOG_DIR)
-
-    # Track command executions for rate limiting
-    command_count = 0
-
-    base_system_prompt = (
-        "You are an Advanced Linux Automation Agent. You have access to a local terminal.\n\n"
-        "**TOOL USE:** To execute a command, use: [[EXEC: <command>]]\n\n"
-        "**RULES:** Stop after calling EXEC. Analyze output before final response.\n\n"
-        "**SAFETY:** This agent operates in a risk-averse mode prioritizing system stability. "
-        "All commands are filtered through safety mechanisms. Never attempt to bypass security controls."
-    )
+    session = AgentSession()
 
     print(f"\n--- AGENTIC TERMINAL READY (Logging to {LOG_DIR}/) ---")
-    history = []
-
-    # Add the initial prompt
-    logger.log("USER", prompt)
-    specialized_context = ContextManager.get_relevant_context(prompt)
-    current_system_message = base_system_prompt
-    if specialized_context:
-        current_system_message += f"\n\n--- ACTIVE KNOWLEDGE ---\n{specialized_context}"
-
-    messages = [{"role": "system", "content": current_system_message}]
-    messages.extend(history)
-    messages.append({"role": "user", "content": prompt})
-    history.append({"role": "user", "content": prompt})
-
-    # Process the prompt
-    while True:
-        print("Agent thinking...", end="\r")
-        response = AgentLLM.chat(messages)
-        print(f"\rAgent: {response}\n")
-
-        logger.log("AGENT", response)
-        history.append({"role": "assistant", "content": response})
-        messages.append({"role": "assistant", "content": response})
-
-        match = re.search(r"\[\[EXEC:\s*(.*?)\s*\]\]", response, re.DOTALL)
-        if match:
-            cmd = match.group(1).strip()
-            print(f"\n[?] Agent requests execution: \033[93m{cmd}\033[0m")
-
-            if MODEL_AUTOMATION:
-                confirm = "y"
-            else:
-                confirm = input("[y/n] > ").lower()
-
-            if confirm == "y":
-                # Rate limit command executions
-                command_count += 1
-                if command_count > MAX_COMMAND_EXECUTIONS:
-                    execution_result = f"Error: Command execution limit exceeded ({MAX_COMMAND_EXECUTIONS}). Please restart the session to continue."
-                    logger.log("SYSTEM", execution_result)
-                    print(f"[!] {execution_result}")
-                else:
-                    logger.log("SYSTEM", f"Executing Command: {cmd}")
-                    execution_result = terminal.execute(cmd)
-                    logger.log("TERMINAL_OUTPUT", execution_result)
-                    print(f"[*] Output:\n{execution_result}")
-            else:
-                execution_result = "User denied execution."
-                logger.log("SYSTEM", "User denied command execution.")
-                print("[!] Execution denied.")
 
-            messages.append(
-                {"role": "user", "content": f"COMMAND OUTPUT:\n{execution_result}"}
-            )
-            continue
-        else:
-            break
+    try:
+        await session.handle_turn(prompt)
+    finally:
+        session.close()
 
     print("\nSession completed.")
 
 
+async def run_many(prompts: List[str], max_inflight: int = 32) -> List[str]:
+    """
+    Runs every prompt in its own quiet agent session, at most `max_inflight`
+    at a time, so the LLM server can batch the concurrent requests. Each
+    answer is printed as soon as its session finishes; all answers are
+    returned in prompt order. A prompt whose session fails gets an "Error: ..."
+    answer instead of aborting the sessions still running.
+    """
+    semaphore = asyncio.Semaphore(max_inflight)
+
+    async def run_one(index: int, prompt: str) -> str:
+        async with semaphore:
+            session = AgentSession(quiet=True, log_suffix=f"_batch{index + 1:03d}")
+            try:
+                answer = await session.handle_turn(prompt)
+            except Exception as e:
+                answer = f"Error: {str(e)}"
+                session.logger.log("SYSTEM", answer)
+            finally:
+                session.close()
+        print(f"\n### [{index + 1}/{len(prompts)}] {prompt}\n{answer}")
+        return answer
+
+    return await asyncio.gather(*(run_one(i, p) for i, p in enumerate(prompts)))
+
+
+def _positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value!r}")
+    return int(value)
+
+
+async def main(args: argparse.Namespace):
+    # asyncio.run() replaces the SIGINT handler with one that only cancels the
+    # main task, which leaves a blocking input() prompt hanging. Restore the
+    # default so Ctrl+C raises KeyboardInterrupt wherever the session is.
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        if args.batch:
+            with open(args.batch, encoding="utf-8") if args.batch != "-" else sys.stdin as f:
+                prompts = [line.strip() for line in f if line.strip()]
+            print(f"Running {len(prompts)} prompts in batch mode (Logging to {LOG_DIR}/)")
+            await run_many(prompts, args.max_inflight)
+        elif args.prompt:
+            if args.loop:
+                print("Running in loop mode. Press Ctrl+C to exit.")
+                try:
+                    while True:
+                        await run_single_prompt(args.prompt)
+                        print("\n--- Press Enter for next iteration or Ctrl+C to exit ---")
+                        input()
+                except KeyboardInterrupt:
+                    print("\nExiting loop mode.")
+            else:
+                await run_single_prompt(args.prompt)
+        else:
+            # Original interactive mode
+            await run_agentic_session()
+    finally:
+        await _CLIENT.aclose()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="OSAgent - AI-Powered Terminal Assistant"
@@ -373,21 +823,20 @@ if __name__ == "__main__":
         action="store_true",
         help="Run in continuous loop mode (requires --prompt). Agent will re-prompt after each completion.",
     )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        type=str,
+        metavar="FILE",
+        help="Run every prompt in FILE (one per line, '-' for stdin) concurrently and print each answer.",
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=_positive_int,
+        default=32,
+        help="Maximum number of batch prompts processed at the same time (default: 32).",
+    )
 
     args = parser.parse_args()
 
-    if args.prompt:
-        if args.loop:
-            print("Running in loop mode. Press Ctrl+C to exit.")
-            try:
-                while True:
-                    run_single_prompt(args.prompt)
-                    print("\n--- Press Enter for next iteration or Ctrl+C to exit ---")
-                    input()
-            except KeyboardInterrupt:
-                print("\nExiting loop mode.")
-        else:
-            run_single_prompt(args.prompt)
-    else:
-        # Original interactive mode
-        run_agentic_session()
+    asyncio.run(main(args))
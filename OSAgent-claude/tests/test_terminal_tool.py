@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TerminalTool
+
+
+class TerminalToolTest(unittest.TestCase):
+    def setUp(self):
+        self.tool = TerminalTool()
+        self.tool.COMMAND_TIMEOUT = 5
+
+    def tearDown(self):
+        self.tool.close()
+
+    def test_state_persists_between_commands(self):
+        self.tool._run("cd /tmp && export OSAGENT_TEST=1")
+        self.assertEqual(self.tool._run("pwd; echo $OSAGENT_TEST"), (0, "/tmp\n1\n", ""))
+
+    def test_exit_keeps_stderr_and_status(self):
+        self.assertEqual(self.tool._run("echo out; echo err >&2; exit 3"), (3, "out\n", "err\n"))
+        self.assertEqual(self.tool._run("echo again"), (0, "again\n", ""))
+
+    def test_redirecting_shell_fds_only_lasts_for_the_command(self):
+        for command in (
+            "exec 2>&1",
+            "exec 2>/dev/null",
+            "exec 1>/dev/null",
+            "exec 1>&-",
+            f"exec {TerminalTool._SAVED_STDOUT}>&- {TerminalTool._SAVED_STDERR}>/dev/null",
+        ):
+            with self.subTest(command=command):
+                self.assertEqual(self.tool._run(command)[0], 0)
+                self.assertEqual(self.tool._run("echo out; echo err >&2"), (0, "out\n", "err\n"))
+
+    def test_timeout_restarts_the_shell(self):
+        self.tool.COMMAND_TIMEOUT = 0.5
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.tool._run("sleep 5")
+        self.assertEqual(self.tool._run("echo ok")[1], "ok\n")
+
+    def test_close_kills_a_running_command(self):
+        worker = threading.Thread(target=self.tool.execute, args=("sleep 20",))
+        worker.start()
+        time.sleep(0.3)
+        started = time.monotonic()
+        self.tool.close()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertLess(time.monotonic() - started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()